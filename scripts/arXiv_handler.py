@@ -1,14 +1,28 @@
 import logging
-logging.getLogger("arxiv").setLevel(logging.ERROR)   
+logging.getLogger("arxiv").setLevel(logging.ERROR)
 import arxiv
+import calendar
+import functools
+import json
+import os
 import re
+import requests
+import xml.etree.ElementTree as ET
+
+OAI_URL = "https://export.arxiv.org/oai2"
+OAI_NS = "{http://www.openarchives.org/OAI/2.0/}"
+MONTH_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".cache", "months")
+MONTH_BOUNDS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".cache", "month_bounds.json")
+
+_month_bounds = None
 
 def get_ID(month, year, number):
     """Return arXiv ID in YYMM.NNNNN format."""
     return f"{year % 100:02d}{month:02d}.{number:05d}"
 
+@functools.lru_cache(maxsize=100000)
 def id_exists(paper_id):
-    """Check if a specific arXiv ID exists."""
+    """Check if a specific arXiv ID exists (memoized — IDs never disappear)."""
     search = arxiv.Search(id_list=[paper_id])
     client = arxiv.Client(page_size=1, delay_seconds=0.2)
     try:
@@ -20,41 +34,81 @@ def id_exists(paper_id):
         # Network or parsing error — assume not found for safety
         return False
 
+def list_month_ids(year, month):
+    """
+    Return the sorted numeric tails of all arXiv IDs announced in a month.
+    One OAI-PMH ListIdentifiers call (plus resumption pages) replaces the
+    dozens of per-ID probes a binary search would need; the result is
+    persisted to a JSON cache so reruns skip the fetch entirely.
+    """
+    cache_path = os.path.join(MONTH_CACHE_DIR, f"{year:04d}-{month:02d}.json")
+    if os.path.exists(cache_path):
+        with open(cache_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    last_day = calendar.monthrange(year, month)[1]
+    params = {
+        "verb": "ListIdentifiers",
+        "metadataPrefix": "arXiv",
+        "from": f"{year:04d}-{month:02d}-01",
+        "until": f"{year:04d}-{month:02d}-{last_day:02d}",
+    }
+    prefix = f"{year % 100:02d}{month:02d}."
+    tails = set()
+    while True:
+        response = requests.get(OAI_URL, params=params, timeout=60)
+        response.raise_for_status()
+        root = ET.fromstring(response.content)
+        for ident in root.iter(f"{OAI_NS}identifier"):
+            # e.g. 'oai:arXiv.org:2303.07856' — skip old-style IDs like 'math/0303001'
+            paper_id = ident.text.rsplit(":", 1)[-1]
+            tail = paper_id[len(prefix):]
+            if paper_id.startswith(prefix) and tail.isdigit():
+                tails.add(int(tail))
+        token = root.find(f"{OAI_NS}ListIdentifiers/{OAI_NS}resumptionToken")
+        if token is None or not token.text:
+            break
+        params = {"verb": "ListIdentifiers", "resumptionToken": token.text}
+
+    tails = sorted(tails)
+    os.makedirs(MONTH_CACHE_DIR, exist_ok=True)
+    with open(cache_path, "w", encoding="utf-8") as f:
+        json.dump(tails, f)
+    return tails
+
+def _month_bounds_for(year, month):
+    """
+    (first, last) ID tails for a month, shared across all callers.
+    Backed by .cache/month_bounds.json so multi-year runs (and reruns)
+    resolve every month boundary they've seen before without touching
+    the full month listing again.
+    """
+    global _month_bounds
+    if _month_bounds is None:
+        try:
+            with open(MONTH_BOUNDS_PATH, "r", encoding="utf-8") as f:
+                _month_bounds = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            _month_bounds = {}
+
+    key = f"{year:04d}-{month:02d}"
+    if key not in _month_bounds:
+        tails = list_month_ids(year, month)
+        _month_bounds[key] = [tails[0], tails[-1]] if tails else [None, None]
+        os.makedirs(os.path.dirname(MONTH_BOUNDS_PATH), exist_ok=True)
+        with open(MONTH_BOUNDS_PATH, "w", encoding="utf-8") as f:
+            json.dump(_month_bounds, f)
+    return _month_bounds[key]
+
+@functools.lru_cache(maxsize=None)
 def find_first_id(year, month):
-    """Find the first valid arXiv ID of a given month using exponential + binary search."""
-    low, high = 1, 1
-    # Exponential search upward until we find a valid ID
-    while not id_exists(get_ID(month, year, high)):
-        high *= 2
-        if high > 99999:
-            return None  # No valid papers this month
-
-    # Now binary search between low and high to find the *first* valid ID
-    while low + 1 < high:
-        mid = (low + high) // 2
-        if id_exists(get_ID(month, year, mid)):
-            high = mid
-        else:
-            low = mid
-    return high
+    """Find the first valid arXiv ID of a given month from the OAI-PMH listing."""
+    return _month_bounds_for(year, month)[0]
 
+@functools.lru_cache(maxsize=None)
 def find_last_id(year, month):
-    """Find the last valid arXiv ID of a given month."""
-    low, high = 1, 1
-    # Exponential search upward until we find a missing ID
-    while id_exists(get_ID(month, year, high)):
-        high *= 2
-        if high > 99999:
-            return 99999
-    low = high // 2
-    # Binary search for the last existing ID
-    while low + 1 < high:
-        mid = (low + high) // 2
-        if id_exists(get_ID(month, year, mid)):
-            low = mid
-        else:
-            high = mid
-    return low
+    """Find the last valid arXiv ID of a given month from the OAI-PMH listing."""
+    return _month_bounds_for(year, month)[1]
 
 def get_IDs_month(month, year, start_number, end_number):
     """Get all valid arXiv IDs in a given month."""
@@ -123,11 +177,9 @@ def format_arxiv_id_for_key(arxiv_id):
         2304.07856 -> 202304-07856
         1912.00123 -> 201912-00123
     """
-    match = re.match(r'^(\d{2})(\d{2})\.(\d{5})$', arxiv_id)
-    if match:
-        yy, mm, id_num = match.groups()
-        # Convert YY to YYYY (assuming 20YY for papers after 2000)
-        yyyy = f"20{yy}"
-        return f"{yyyy}{mm}-{id_num}"
+    # Pure slicing — the YYMM.NNNNN shape is fixed-width, no regex needed
+    # (assuming 20YY for papers after 2000)
+    if len(arxiv_id) == 10 and arxiv_id[4] == '.' and arxiv_id[:4].isdigit() and arxiv_id[5:].isdigit():
+        return f"20{arxiv_id[:4]}-{arxiv_id[5:]}"
     return arxiv_id  # Return as-is if format doesn't match
 
@@ -1,61 +1,67 @@
 import os
 import re
+import numpy as np
 
-PATTERN = re.compile(r"^(\d{4})-(\d{5})$")  # e.g. 2303-07856
+PATTERN = re.compile(r"^(\d{4})-(\d{5})$", re.ASCII)  # e.g. 2303-07856
 
 def collect_ids(base_dir: str):
-    ids = []
+    """Scan base_dir once; return folder names and their numeric tails sorted by tail."""
+    names = []
+    tails = []
     for entry in os.scandir(base_dir):
-        if entry.is_dir():
+        # follow_symlinks=False answers from the DirEntry's cached type
+        # info — no stat syscall per entry
+        if entry.is_dir(follow_symlinks=False):
             m = PATTERN.match(entry.name)
             if m:
-                yymm = m.group(1)
-                tail = m.group(2)
-                ids.append((entry.name, yymm, int(tail)))
-    return sorted(ids, key=lambda x: x[2])  # sort by numeric tail
+                names.append(entry.name)
+                tails.append(int(m.group(2)))
+    tails = np.asarray(tails, dtype=np.int32)
+    order = np.argsort(tails, kind="stable")
+    return [names[i] for i in order], tails[order]
 
 def check_sequence(base_dir: str, start_tail: int = 7856, end_tail: int = 9100):
-    ids = collect_ids(base_dir)
-    if not ids:
+    names, tails = collect_ids(base_dir)
+    if tails.size == 0:
         print("No matching folders.")
         return
 
-    print(f"Found {len(ids)} candidate folders.")
-    tails = [t for _, _, t in ids]
+    print(f"Found {tails.size} candidate folders.")
 
-    # Check ordering
-    is_strict_increasing = all(tails[i] < tails[i+1] for i in range(len(tails)-1))
+    # Check ordering (vectorized — no Python-level pairwise loop)
+    is_strict_increasing = bool(np.all(np.diff(tails) > 0))
     print(f"Strictly increasing: {is_strict_increasing}")
 
-    # Expected range
-    expected_set = set(range(start_tail, end_tail + 1))
-    present_set = set(tails)
-    missing = sorted(expected_set - present_set)
-    extra = sorted(present_set - expected_set)
+    # Expected range via set arithmetic on contiguous int32 arrays
+    expected = np.arange(start_tail, end_tail + 1, dtype=np.int32)
+    missing = np.setdiff1d(expected, tails, assume_unique=True)
+    extra = np.setdiff1d(tails, expected, assume_unique=True)
 
     print(f"Start expected: {start_tail}, End expected: {end_tail}")
-    print(f"Present min: {min(tails)}, Present max: {max(tails)}")
+    print(f"Present min: {tails.min()}, Present max: {tails.max()}")
 
-    if missing:
-        print(f"Missing ({len(missing)}): {', '.join(f'"{m:05d}"' for m in missing[:50])}"
-              + (" ..." if len(missing) > 50 else ""))
+    if missing.size:
+        shown = ', '.join(f'"{m:05d}"' for m in missing[:50])
+        print(f"Missing ({missing.size}): {shown}"
+              + (" ..." if missing.size > 50 else ""))
     else:
         print("No missing IDs in range.")
 
-    if extra:
-        print(f"Out-of-range ({len(extra)}): {', '.join(f'{e:05d}' for e in extra[:50])}"
-              + (" ..." if len(extra) > 50 else ""))
+    if extra.size:
+        shown = ', '.join(f'{e:05d}' for e in extra[:50])
+        print(f"Out-of-range ({extra.size}): {shown}"
+              + (" ..." if extra.size > 50 else ""))
     else:
         print("No out-of-range IDs.")
 
     # List first and last few folders
     print("First 5 folders:")
-    for name, yymm, tail in ids[:5]:
+    for name, tail in zip(names[:5], tails[:5]):
         print(f"  {name} (tail={tail})")
     print("Last 5 folders:")
-    for name, yymm, tail in ids[-5:]:
+    for name, tail in zip(names[-5:], tails[-5:]):
         print(f"  {name} (tail={tail})")
 
 if __name__ == "__main__":
     BASE_DIR = r"d:\Data\Learning\University\Year3\Intro to DS\Data_Science_Project\Milestone1\23127130"
-    check_sequence(BASE_DIR, start_tail=7856, end_tail=12855)
\ No newline at end of file
+    check_sequence(BASE_DIR, start_tail=7856, end_tail=12855)
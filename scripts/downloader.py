@@ -1,11 +1,90 @@
+import asyncio
+import io
 import os
 import re
+import shutil
 import tarfile
-import requests
 import string
+import time
+import httpx
+import xml.etree.ElementTree as ET
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
 from metadata_collector import save_metadata
 
+try:
+    # SIMD-accelerated DEFLATE (Intel ISA-L) — decompresses 2-4× faster
+    # than the stdlib zlib; fall back silently when not installed
+    from isal import igzip
+except ImportError:
+    igzip = None
+
 ARXIV_HOST = "https://arxiv.org"
+USER_AGENT = "arxiv-downloader/1.0 (+https://github.com/your-handle)"
+
+S3_BUCKET = "arxiv"  # requester-pays bulk bucket
+S3_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".cache", "s3")
+BULK_S3 = False  # flipped on by the --bulk flag in main.py
+
+_s3_manifest = None
+
+
+def parse_retry_after(headers):
+    """
+    Return the server-requested wait in seconds from a Retry-After header
+    (integer-seconds or HTTP-date form), or None if absent/unparseable.
+    """
+    value = headers.get("Retry-After") if headers else None
+    if value is None:
+        return None
+    try:
+        return max(0, int(value))
+    except ValueError:
+        pass
+    try:
+        dt = parsedate_to_datetime(value)
+        return max(0.0, (dt - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+class RateLimiter:
+    """
+    Shared pacing for arxiv.org: at most one request every `interval`
+    seconds across all workers, instead of each worker sleeping after
+    its own work is already done.
+    """
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._lock = asyncio.Lock()
+        self._next_at = 0.0
+
+    async def wait(self):
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next_at - now
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._next_at = max(now, self._next_at) + self.interval
+
+
+# arXiv asks automated clients for no more than ~1 request every 3 s
+arxiv_limiter = RateLimiter(3.0)
+
+def make_session() -> httpx.AsyncClient:
+    """
+    One shared HTTP/2 client for the whole run.
+    A single multiplexed connection carries many concurrent streams, so
+    dozens of in-flight requests share one TLS handshake instead of
+    opening a connection each; limits still cap total concurrency.
+    """
+    return httpx.AsyncClient(
+        http2=True,
+        limits=httpx.Limits(max_connections=16, max_keepalive_connections=8),
+        timeout=60.0,
+        follow_redirects=True,
+        headers={"User-Agent": USER_AGENT},
+    )
 
 def format_yymm_id(base_id: str) -> str:
     """'2303.07856' -> '2303-07856'"""
@@ -19,16 +98,31 @@ def sanitize_filename(name: str) -> str:
     safe_chars = f"-_.{string.ascii_letters}{string.digits}/"
     return ''.join(c if c in safe_chars else '_' for c in name)
 
-def safe_extract_tar(tar_path: str, extract_to: str) -> None:
-    """Safely extract a tar.gz file using 'filter=data', skipping broken entries."""
+def safe_extract_tar(fileobj, extract_to: str) -> None:
+    """
+    Safely extract a tar.gz stream using 'filter=data', skipping broken entries.
+    Uses tarfile's streaming mode ('r|gz') so members are decompressed and
+    written on the fly — the archive never touches disk as a whole.
+    """
     try:
-        with tarfile.open(tar_path, "r:gz") as tar:
-            for member in tar.getmembers():
+        if igzip is not None:
+            # Do the gunzip step with isal; tarfile then reads a plain tar stream
+            fileobj = igzip.IGzipFile(fileobj=fileobj)
+            mode = "r|"
+        else:
+            mode = "r|gz"
+        with tarfile.open(fileobj=fileobj, mode=mode) as tar:
+            for member in tar:
                 try:
                     # Skip symbolic links and absolute paths (security)
                     if member.islnk() or member.issym() or member.name.startswith("/") or ".." in member.name:
                         continue
-                    
+
+                    # Only .tex/.bib survive downstream — skip everything else
+                    # before it is ever decompressed to disk
+                    if not member.name.endswith(('.tex', '.bib')):
+                        continue
+
                     member.name = sanitize_filename(member.name)
                     target_path = os.path.join(extract_to, member.name)
                     target_dir = os.path.dirname(target_path)
@@ -37,45 +131,161 @@ def safe_extract_tar(tar_path: str, extract_to: str) -> None:
                     # Extract safely
                     tar.extract(member, path=extract_to, filter="data")
                 except (FileNotFoundError, OSError, tarfile.ExtractError) as inner_e:
-                    print(f"⚠️ Skipped bad entry in {os.path.basename(tar_path)}: {member.name} ({inner_e})")
+                    print(f"⚠️ Skipped bad entry in {os.path.basename(extract_to)}: {member.name} ({inner_e})")
                     continue
     except Exception as e:
-        print(f"[Error] Extraction failed for {tar_path}: {e}")
+        print(f"[Error] Extraction failed for {extract_to}: {e}")
 
 
-def download_url(url: str, out_path: str) -> bool:
-    """Basic downloader (no retry, no backoff)."""
-    headers = {"User-Agent": "arxiv-downloader/1.0 (+https://github.com/your-handle)"}
+def _src_signature(headers):
+    """(Content-Length, ETag) pair identifying the archive bytes, or None if neither is set."""
+    sig = (headers.get("Content-Length"), headers.get("ETag"))
+    return sig if any(sig) else None
+
+
+async def fetch_src(session: httpx.AsyncClient, full_id: str):
+    """
+    Fetch the source tarball for one version into memory (no retry, no backoff).
+    Returns (buffer, signature); (None, None) on failure.
+    """
+    src_url = f"{ARXIV_HOST}/src/{full_id}"
     try:
-        with requests.get(url, headers=headers, stream=True, timeout=30) as r:
+        await arxiv_limiter.wait()
+        async with session.stream("GET", src_url) as r:
             if r.status_code == 200:
-                os.makedirs(os.path.dirname(out_path), exist_ok=True)
-                with open(out_path, "wb") as f:
-                    for chunk in r.iter_content(8192):
-                        if chunk:
-                            f.write(chunk)
-                return True
-            print(f"HTTP {r.status_code} for {url}")
-            return False
-    except requests.RequestException as e:
-        print(f"Download failed for {url}: {e}")
-        return False
+                buf = io.BytesIO()
+                # 1 MiB chunks: ~16× fewer loop iterations per archive than 64 KiB
+                async for chunk in r.aiter_bytes(1 << 20):
+                    buf.write(chunk)
+                buf.seek(0)
+                return buf, _src_signature(r.headers)
+            print(f"HTTP {r.status_code} for {src_url}")
+            return None, None
+    except httpx.HTTPError as e:
+        print(f"Download failed for {src_url}: {e}")
+        return None, None
 
 
-def cleanup_non_tex_bib_files(folder: str) -> None:
-    """Remove all non-.tex and non-.bib files."""
-    for root, _, files in os.walk(folder):
-        for file in files:
-            if not (file.endswith(".tex") or file.endswith(".bib")):
+async def head_src(session: httpx.AsyncClient, full_id: str):
+    """HEAD the source URL and return its signature — one cheap round trip, no body."""
+    src_url = f"{ARXIV_HOST}/src/{full_id}"
+    try:
+        await arxiv_limiter.wait()
+        r = await session.head(src_url)
+        if r.status_code == 200:
+            return _src_signature(r.headers)
+    except httpx.HTTPError:
+        pass
+    return None
+
+
+def link_tree(src_root: str, dst_root: str) -> None:
+    """Hardlink every file under src_root into the same layout under dst_root."""
+    os.makedirs(dst_root, exist_ok=True)
+    with os.scandir(src_root) as it:
+        for entry in it:
+            target = os.path.join(dst_root, entry.name)
+            if entry.is_dir(follow_symlinks=False):
+                link_tree(entry.path, target)
+            elif not os.path.exists(target):
                 try:
-                    os.remove(os.path.join(root, file))
-                except OSError as e:
-                    print(f"Warning: could not remove {file}: {e}")
+                    os.link(entry.path, target)
+                except OSError:
+                    shutil.copyfile(entry.path, target)
+
+
+def _find_s3_archive_key(s3, base_id: str):
+    """Look up which monthly S3 archive chunk contains a paper, via the src manifest."""
+    global _s3_manifest
+    if _s3_manifest is None:
+        manifest_path = os.path.join(S3_CACHE_DIR, "arXiv_src_manifest.xml")
+        if not os.path.exists(manifest_path):
+            os.makedirs(S3_CACHE_DIR, exist_ok=True)
+            s3.download_file(S3_BUCKET, "src/arXiv_src_manifest.xml", manifest_path,
+                             ExtraArgs={"RequestPayer": "requester"})
+        entries = []
+        root = ET.parse(manifest_path).getroot()
+        for item in root.iter("file"):
+            entries.append((item.findtext("filename"),
+                            item.findtext("first_item"),
+                            item.findtext("last_item")))
+        _s3_manifest = entries
 
+    yymm = base_id.split('.')[0]
+    for filename, first, last in _s3_manifest:
+        # Same-month chunks only, so the lexicographic range check is safe
+        if filename and f"_{yymm}_" in filename and first and last and first <= base_id <= last:
+            return filename
+    return None
 
-def download(list_download: list, base_dir: str) -> None:
+
+def fetch_src_s3(full_id: str):
+    """
+    Pull a paper's source from the arXiv requester-pays S3 bucket instead of
+    the rate-limited arxiv.org /src/ endpoint. The monthly archive chunk the
+    paper lives in is downloaded once into .cache/s3 and reused for every
+    other paper of that month, so a bulk backfill costs one GetObject per
+    chunk rather than one web hit per paper.
+
+    Returns the .gz source as an in-memory stream, or None when the paper is
+    missing from the S3 snapshot (callers fall back to /src/). Note the
+    snapshot only carries the latest version of each paper.
+    """
+    try:
+        import boto3
+    except ImportError:
+        print("[S3] boto3 not installed — falling back to arxiv.org /src/")
+        return None
+
+    base_id = full_id.split('v')[0]
+    try:
+        s3 = boto3.client("s3")
+        archive_key = _find_s3_archive_key(s3, base_id)
+        if archive_key is None:
+            print(f"[S3] {base_id} not in the bulk manifest")
+            return None
+
+        local_path = os.path.join(S3_CACHE_DIR, os.path.basename(archive_key))
+        if not os.path.exists(local_path):
+            print(f"[S3] Fetching archive chunk {archive_key}...")
+            s3.download_file(S3_BUCKET, archive_key, local_path,
+                             ExtraArgs={"RequestPayer": "requester"})
+
+        member = f"{base_id.split('.')[0]}/{base_id}.gz"
+        with tarfile.open(local_path, "r") as tar:
+            try:
+                extracted = tar.extractfile(member)
+            except KeyError:
+                print(f"[S3] {member} not found in {archive_key}")
+                return None
+            if extracted is None:
+                return None
+            return io.BytesIO(extracted.read())
+    except Exception as e:
+        print(f"[S3] Fetch failed for {full_id}: {e}")
+        return None
+
+
+def cleanup_non_tex_bib_files(folder: str) -> None:
+    """Remove all non-.tex and non-.bib files (scandir recursion, no per-entry stat)."""
+    try:
+        with os.scandir(folder) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    cleanup_non_tex_bib_files(entry.path)
+                elif not entry.name.endswith(('.tex', '.bib')):
+                    try:
+                        os.unlink(entry.path)
+                    except OSError as e:
+                        print(f"Warning: could not remove {entry.name}: {e}")
+    except OSError as e:
+        print(f"Warning: could not scan {folder}: {e}")
+
+
+async def download(session: httpx.AsyncClient, list_download: list, base_dir: str) -> None:
     """
     Downloads all versions of an arXiv paper using /src/{id} URL.
+    All versions stream in parallel-friendly async I/O on one session.
     Extracts .tex/.bib files and saves metadata.
     """
     if not list_download:
@@ -95,42 +305,47 @@ def download(list_download: list, base_dir: str) -> None:
     tex_root = os.path.join(folder_arxiv, "tex")
     os.makedirs(tex_root, exist_ok=True)
 
-    for result in list_download:
+    # Latest version first: older versions are frequently byte-identical
+    # to it, and a HEAD comparison lets us hardlink instead of re-download
+    latest_sig = None
+    latest_folder = None
+    for result in reversed(list_download):
         full_id = result.get_short_id()  # e.g. '2305.00633v4'
         folder_version = os.path.join(tex_root, full_id)  # put all versions under .../<paper>/tex/<version>
         os.makedirs(folder_version, exist_ok=True)
 
-        src_url = f"{ARXIV_HOST}/src/{full_id}"
-        tar_path = os.path.join(folder_version, f"{full_id}.tar.gz")
-        print(f"Attempting source: {src_url}")
+        if latest_sig is not None:
+            sig = await head_src(session, full_id)
+            if sig == latest_sig:
+                print(f"🔗 {full_id} matches latest source — linking instead of downloading")
+                await asyncio.to_thread(link_tree, latest_folder, folder_version)
+                continue
 
-        if not download_url(src_url, tar_path):
+        buf = None
+        sig = None
+        if BULK_S3:
+            # boto3 is blocking — keep the S3 fetch off the event loop
+            buf = await asyncio.to_thread(fetch_src_s3, full_id)
+        if buf is None:
+            print(f"Attempting source: {ARXIV_HOST}/src/{full_id}")
+            buf, sig = await fetch_src(session, full_id)
+        if buf is None:
             print(f"Source unavailable for {full_id}")
             continue
 
-        # Validate and extract
-        if not tarfile.is_tarfile(tar_path):
-            print(f"Invalid tar archive for {full_id}. Removing file.")
-            try:
-                os.remove(tar_path)
-            except OSError as e:
-                print(f"Could not remove invalid file {tar_path}: {e}")
-            continue
+        # Extract straight from the in-memory stream (bad gzip/tar is
+        # caught and reported inside safe_extract_tar)
+        # Decompression is CPU-bound — run it in the default executor so
+        # other coroutines keep downloading while this paper extracts
+        await asyncio.to_thread(safe_extract_tar, buf, folder_version)
+        print(f"✅ Extracted to {folder_version}")
 
-        try:
-            safe_extract_tar(tar_path, folder_version)
-            cleanup_non_tex_bib_files(folder_version)
-            print(f"✅ Extracted to {folder_version}")
-        except Exception as e:
-            print(f"⚠️ Extraction failed for {full_id}: {e}")
-        finally:
-            try:
-                os.remove(tar_path)
-            except OSError:
-                pass
+        if latest_folder is None:
+            latest_folder = folder_version
+            latest_sig = sig
 
-    # Save metadata after all versions
+    # Save metadata after all versions (disk write — also off the loop)
     try:
-        save_metadata(result, folder_arxiv)
+        await asyncio.to_thread(save_metadata, list_download[-1], folder_arxiv)
     except Exception as e:
         print(f"⚠️ Metadata save failed for {arxiv_id}: {e}")
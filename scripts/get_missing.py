@@ -1,9 +1,8 @@
-import threading
-import queue
+import asyncio
 import time
 import arxiv
 from arXiv_handler import get_IDs_All
-from downloader import download
+from downloader import download, make_session, parse_retry_after
 from reference_extractor import extract_references_for_paper
 import os
 import random
@@ -13,15 +12,15 @@ MISSING_TAILS = [
     "12094", "12097"]
 MISSING_YM = "2303"  # year-month part for all these IDs
 
-def fetch_ids_worker(start_month, start_year, start_ID, end_month, end_year, end_ID, start_index, num_papers, id_queue):
+async def fetch_ids_worker(start_month, start_year, start_ID, end_month, end_year, end_ID, start_index, num_papers, id_queue):
     # Override normal range fetch: use explicit missing IDs
     print("[Step 1] Using explicit missing IDs list.")
     selected_ids = [f"{MISSING_YM}.{tail}" for tail in MISSING_TAILS]
     print(f"[Step 1] Loaded {len(selected_ids)} missing IDs.")
     for arxiv_id in selected_ids:
-        id_queue.put(arxiv_id)
-    for _ in range(DOWNLOAD_THREAD_COUNT):
-        id_queue.put(None)
+        await id_queue.put(arxiv_id)
+    for _ in range(DOWNLOAD_WORKER_COUNT):
+        await id_queue.put(None)
 # ...existing code...
 
 def download_with_retries(client, arxiv_id, max_retries=5):
@@ -34,7 +33,12 @@ def download_with_retries(client, arxiv_id, max_retries=5):
         except Exception as e:
             error_str = str(e)
             if "HTTP 429" in error_str or "HTTP 503" in error_str:
-                wait_time = min(60 * (2 ** attempt), 600)  # exponential backoff (up to 10 min)
+                # Honor the server's Retry-After when it tells us exactly
+                # how long to wait; exponential backoff only as fallback
+                headers = getattr(getattr(e, "response", None), "headers", None)
+                wait_time = parse_retry_after(headers)
+                if wait_time is None:
+                    wait_time = min(60 * (2 ** attempt), 600)  # exponential backoff (up to 10 min)
                 jitter = random.uniform(0, 5)
                 print(f"[Download] Server busy ({error_str}). Retrying {arxiv_id} in {wait_time + jitter:.1f}s...")
                 time.sleep(wait_time + jitter)
@@ -44,59 +48,84 @@ def download_with_retries(client, arxiv_id, max_retries=5):
     raise RuntimeError(f"[Download] Failed after {max_retries} retries for {arxiv_id}")
 
 
-def download_worker(id_queue, download_queue, base_data_dir, delay=2):
+def fetch_all_versions(arxiv_id, version_latest):
+    """Fetch metadata for every version of a paper in a single id_list query."""
+    id_list = [f"{arxiv_id}v{v}" for v in range(1, version_latest + 1)]
+    client = arxiv.Client(page_size=version_latest, delay_seconds=0.5, num_retries=5)
+    search = arxiv.Search(id_list=id_list, max_results=version_latest)
+    return list(client.results(search))
+
+
+async def download_worker(id_queue, download_queue, session, sem, base_data_dir, delay=2):
     client = arxiv.Client()
     processed = 0
     while True:
-        arxiv_id = id_queue.get()
+        arxiv_id = await id_queue.get()
         if arxiv_id is None:
-            download_queue.put(None)
-            print(f"[Download] Thread finished. Total papers downloaded: {processed}")
+            await download_queue.put(None)
+            print(f"[Download] Worker finished. Total papers downloaded: {processed}")
             break
 
         try:
             print(f"[Download] Starting: {arxiv_id}")
-            result_latest = download_with_retries(client, arxiv_id)
+            async with sem:
+                # arxiv library is blocking — keep it off the event loop
+                result_latest = await asyncio.to_thread(download_with_retries, client, arxiv_id)
 
-            # Determine latest version number
-            version_latest = int(result_latest.get_short_id().split('v')[1])
-            list_download = [result_latest]
+                # Determine latest version number
+                version_latest = int(result_latest.get_short_id().split('v')[1])
 
-            # Download older versions
-            for v in range(1, version_latest):
-                arxiv_id_v = f"{arxiv_id}v{v}"
-                result_v = download_with_retries(client, arxiv_id_v)
-                list_download.append(result_v)
+                # One batched query covers every version — no per-version round trip
+                if version_latest > 1:
+                    list_download = await asyncio.to_thread(fetch_all_versions, arxiv_id, version_latest)
+                else:
+                    list_download = [result_latest]
 
-            # Extract & clean
-            download(list_download, base_data_dir)
+                # Extract & clean
+                await download(session, list_download, base_data_dir)
             processed += 1
             print(f"[Download] Finished: {arxiv_id} (Total: {processed})")
-            download_queue.put(arxiv_id)
-            time.sleep(delay)  # Respect API rate
+            await download_queue.put(arxiv_id)
 
         except Exception as e:
             print(f"[Download] Error for {arxiv_id}: {e}")
             continue
 
 
-def reference_worker(download_queue, base_data_dir, delay=2):
+async def reference_worker(download_queue, session, base_data_dir, delay=2):
     processed = 0
     while True:
-        arxiv_id = download_queue.get()
+        arxiv_id = await download_queue.get()
         if arxiv_id is None:
-            print(f"[Reference] Thread finished. Total papers processed: {processed}")
+            print(f"[Reference] Worker finished. Total papers processed: {processed}")
             break
         try:
             print(f"[Reference] Starting: {arxiv_id}")
-            extract_references_for_paper(arxiv_id, base_data_dir)
+            await extract_references_for_paper(session, arxiv_id, base_data_dir)
             processed += 1
             print(f"[Reference] Finished: {arxiv_id} (Total: {processed})")
-            time.sleep(delay)
+            await asyncio.sleep(delay)
         except Exception as e:
             print(f"[Reference] Error for {arxiv_id}: {e}")
             continue
 
+
+async def main():
+    id_queue = asyncio.Queue(maxsize=DOWNLOAD_WORKER_COUNT * 2)
+    download_queue = asyncio.Queue(maxsize=REFERENCE_WORKER_COUNT * 2)
+    download_sem = asyncio.Semaphore(DOWNLOAD_WORKER_COUNT)
+
+    async with make_session() as session:
+        await asyncio.gather(
+            fetch_ids_worker(start_month, start_year, start_ID, end_month, end_year, end_ID,
+                             start_index, num_papers, id_queue),
+            *[download_worker(id_queue, download_queue, session, download_sem, base_data_dir, 2)
+              for _ in range(DOWNLOAD_WORKER_COUNT)],
+            *[reference_worker(download_queue, session, base_data_dir, 2)
+              for _ in range(REFERENCE_WORKER_COUNT)],
+        )
+
+
 if __name__ == "__main__":
     start_month = 3
     start_year = 2023
@@ -111,36 +140,13 @@ if __name__ == "__main__":
     start_index = 0
     num_papers = len(MISSING_TAILS)
 
-    DOWNLOAD_THREAD_COUNT = 3
-    REFERENCE_THREAD_COUNT = 2
-
-    id_queue = queue.Queue(maxsize=DOWNLOAD_THREAD_COUNT * 2)
-    download_queue = queue.Queue(maxsize=REFERENCE_THREAD_COUNT * 2)
+    DOWNLOAD_WORKER_COUNT = 3
+    REFERENCE_WORKER_COUNT = 2
 
     start_time = time.time()
     print("Starting pipeline for missing IDs...")
 
-    t1 = threading.Thread(target=fetch_ids_worker, args=(
-        start_month, start_year, start_ID, end_month, end_year, end_ID, start_index, num_papers, id_queue))
-    t1.start()
-
-    download_threads = []
-    for _ in range(DOWNLOAD_THREAD_COUNT):
-        t = threading.Thread(target=download_worker, args=(id_queue, download_queue, base_data_dir, 2))
-        t.start()
-        download_threads.append(t)
-
-    reference_threads = []
-    for _ in range(REFERENCE_THREAD_COUNT):
-        t = threading.Thread(target=reference_worker, args=(download_queue, base_data_dir, 2))
-        t.start()
-        reference_threads.append(t)
-
-    t1.join()
-    for t in download_threads:
-        t.join()
-    for t in reference_threads:
-        t.join()
+    asyncio.run(main())
 
     end_time = time.time()
-    print(f"Pipeline complete. Total time: {end_time - start_time:.2f} seconds")
\ No newline at end of file
+    print(f"Pipeline complete. Total time: {end_time - start_time:.2f} seconds")
@@ -1,24 +1,26 @@
-import threading
-import queue
+import asyncio
+import sys
 import time
 import arxiv
 from arXiv_handler import get_IDs_All, get_IDs_network
-from downloader import download
-from reference_extractor import extract_references_for_paper
+import downloader
+from downloader import download, make_session, format_yymm_id, parse_retry_after
+import reference_extractor
+from reference_extractor import extract_references_for_papers, S2_BATCH_SIZE
 import os
 import random
 
 
-def fetch_ids_worker(start_month, start_year, start_ID, end_month, end_year, end_ID, total_paper, start_index, num_papers, id_queue):
+async def fetch_ids_worker(start_month, start_year, start_ID, end_month, end_year, end_ID, total_paper, start_index, num_papers, id_queue):
     print("[Step 1] Fetching arXiv IDs...")
     #ids = get_IDs_All(start_month, start_year, start_ID, end_month, end_year, end_ID)
-    ids = get_IDs_network(start_month, start_year, start_ID, end_month, end_year, end_ID, total_paper)
+    ids = await asyncio.to_thread(get_IDs_network, start_month, start_year, start_ID, end_month, end_year, end_ID, total_paper)
     selected_ids = ids[start_index:start_index + num_papers]
     print(f"[Step 1] Fetched {len(selected_ids)} IDs.")
     for arxiv_id in selected_ids:
-        id_queue.put(arxiv_id)
-    for _ in range(DOWNLOAD_THREAD_COUNT):
-        id_queue.put(None)
+        await id_queue.put(arxiv_id)
+    for _ in range(DOWNLOAD_WORKER_COUNT):
+        await id_queue.put(None)
 
 
 def download_with_retries(client, arxiv_id, max_retries=5):
@@ -31,7 +33,12 @@ def download_with_retries(client, arxiv_id, max_retries=5):
         except Exception as e:
             error_str = str(e)
             if "HTTP 429" in error_str or "HTTP 503" in error_str:
-                wait_time = min(60 * (2 ** attempt), 600)  # exponential backoff (up to 10 min)
+                # Honor the server's Retry-After when it tells us exactly
+                # how long to wait; exponential backoff only as fallback
+                headers = getattr(getattr(e, "response", None), "headers", None)
+                wait_time = parse_retry_after(headers)
+                if wait_time is None:
+                    wait_time = min(60 * (2 ** attempt), 600)  # exponential backoff (up to 10 min)
                 jitter = random.uniform(0, 5)
                 print(f"[Download] Server busy ({error_str}). Retrying {arxiv_id} in {wait_time + jitter:.1f}s...")
                 time.sleep(wait_time + jitter)
@@ -41,58 +48,105 @@ def download_with_retries(client, arxiv_id, max_retries=5):
     raise RuntimeError(f"[Download] Failed after {max_retries} retries for {arxiv_id}")
 
 
-def download_worker(id_queue, download_queue, base_data_dir, delay=2):
+def fetch_all_versions(arxiv_id, version_latest):
+    """Fetch metadata for every version of a paper in a single id_list query."""
+    id_list = [f"{arxiv_id}v{v}" for v in range(1, version_latest + 1)]
+    client = arxiv.Client(page_size=version_latest, delay_seconds=0.5, num_retries=5)
+    search = arxiv.Search(id_list=id_list, max_results=version_latest)
+    return list(client.results(search))
+
+
+async def download_worker(id_queue, download_queue, session, sem, base_data_dir, delay=2):
     client = arxiv.Client()
     processed = 0
     while True:
-        arxiv_id = id_queue.get()
+        arxiv_id = await id_queue.get()
         if arxiv_id is None:
-            download_queue.put(None)
-            print(f"[Download] Thread finished. Total papers downloaded: {processed}")
+            await download_queue.put(None)
+            print(f"[Download] Worker finished. Total papers downloaded: {processed}")
             break
 
         try:
+            # Rerun shortcut: a folder with metadata.json is already complete
+            # (arXiv sources are static) — skip the network entirely
+            if USE_CACHE and os.path.exists(os.path.join(base_data_dir, format_yymm_id(arxiv_id), "metadata.json")):
+                print(f"[Download] Cached: {arxiv_id} already on disk, skipping.")
+                await download_queue.put(arxiv_id)
+                continue
+
             print(f"[Download] Starting: {arxiv_id}")
-            result_latest = download_with_retries(client, arxiv_id)
+            async with sem:
+                # arxiv library is blocking — keep it off the event loop
+                result_latest = await asyncio.to_thread(download_with_retries, client, arxiv_id)
 
-            # Determine latest version number
-            version_latest = int(result_latest.get_short_id().split('v')[1])
-            list_download = [result_latest]
+                # Determine latest version number
+                version_latest = int(result_latest.get_short_id().split('v')[1])
 
-            # Download older versions
-            for v in range(1, version_latest):
-                arxiv_id_v = f"{arxiv_id}v{v}"
-                result_v = download_with_retries(client, arxiv_id_v)
-                list_download.append(result_v)
+                # One batched query covers every version — no per-version round trip
+                if version_latest > 1:
+                    list_download = await asyncio.to_thread(fetch_all_versions, arxiv_id, version_latest)
+                else:
+                    list_download = [result_latest]
 
-            # Extract & clean
-            download(list_download, base_data_dir)
+                # Extract & clean
+                await download(session, list_download, base_data_dir)
             processed += 1
             print(f"[Download] Finished: {arxiv_id} (Total: {processed})")
-            download_queue.put(arxiv_id)
-            time.sleep(delay)  # Respect API rate
+            await download_queue.put(arxiv_id)
 
         except Exception as e:
             print(f"[Download] Error for {arxiv_id}: {e}")
             continue
 
 
-def reference_worker(download_queue, base_data_dir, delay=2):
+async def reference_worker(download_queue, session, base_data_dir, delay=2):
     processed = 0
-    while True:
-        arxiv_id = download_queue.get()
-        if arxiv_id is None:
-            print(f"[Reference] Thread finished. Total papers processed: {processed}")
-            break
+    batch = []
+
+    async def flush():
+        nonlocal processed, batch
+        if not batch:
+            return
         try:
-            print(f"[Reference] Starting: {arxiv_id}")
-            extract_references_for_paper(arxiv_id, base_data_dir)
-            processed += 1
-            print(f"[Reference] Finished: {arxiv_id} (Total: {processed})")
-            time.sleep(delay)
+            print(f"[Reference] Fetching batch of {len(batch)} papers...")
+            await extract_references_for_papers(session, batch, base_data_dir)
+            processed += len(batch)
+            print(f"[Reference] Batch done (Total: {processed})")
         except Exception as e:
-            print(f"[Reference] Error for {arxiv_id}: {e}")
+            print(f"[Reference] Error for batch {batch[0]}..{batch[-1]}: {e}")
+        batch = []
+        await asyncio.sleep(delay)
+
+    while True:
+        # Accumulate IDs; flush on a full batch or a 2 s lull in arrivals
+        try:
+            arxiv_id = await asyncio.wait_for(download_queue.get(), timeout=2.0)
+        except asyncio.TimeoutError:
+            await flush()
             continue
+        if arxiv_id is None:
+            await flush()
+            print(f"[Reference] Worker finished. Total papers processed: {processed}")
+            break
+        batch.append(arxiv_id)
+        if len(batch) >= S2_BATCH_SIZE:
+            await flush()
+
+
+async def main():
+    id_queue = asyncio.Queue(maxsize=DOWNLOAD_WORKER_COUNT * 2)
+    download_queue = asyncio.Queue(maxsize=REFERENCE_WORKER_COUNT * 2)
+    download_sem = asyncio.Semaphore(DOWNLOAD_WORKER_COUNT)
+
+    async with make_session() as session:
+        await asyncio.gather(
+            fetch_ids_worker(start_month, start_year, start_ID, end_month, end_year, end_ID,
+                             total_paper, start_index, num_papers, id_queue),
+            *[download_worker(id_queue, download_queue, session, download_sem, base_data_dir, 2)
+              for _ in range(DOWNLOAD_WORKER_COUNT)],
+            *[reference_worker(download_queue, session, base_data_dir, 2)
+              for _ in range(REFERENCE_WORKER_COUNT)],
+        )
 
 
 if __name__ == "__main__":
@@ -109,36 +163,18 @@ if __name__ == "__main__":
     start_index = 4000
     num_papers = 1000
 
-    DOWNLOAD_THREAD_COUNT = 3
-    REFERENCE_THREAD_COUNT = 2
+    DOWNLOAD_WORKER_COUNT = 3
+    REFERENCE_WORKER_COUNT = 2
 
-    id_queue = queue.Queue(maxsize=DOWNLOAD_THREAD_COUNT * 2)
-    download_queue = queue.Queue(maxsize=REFERENCE_THREAD_COUNT * 2)
+    USE_CACHE = "--no-cache" not in sys.argv
+    reference_extractor.USE_CACHE = USE_CACHE
+    # Historical backfills should come from the S3 bulk bucket, not /src/
+    downloader.BULK_S3 = "--bulk" in sys.argv
 
     start_time = time.time()
     print("Starting pipeline...")
 
-    t1 = threading.Thread(target=fetch_ids_worker, args=(
-        start_month, start_year, start_ID, end_month, end_year, end_ID, total_paper, start_index, num_papers, id_queue))
-    t1.start()
-
-    download_threads = []
-    for _ in range(DOWNLOAD_THREAD_COUNT):
-        t = threading.Thread(target=download_worker, args=(id_queue, download_queue, base_data_dir, 2))
-        t.start()
-        download_threads.append(t)
-
-    reference_threads = []
-    for _ in range(REFERENCE_THREAD_COUNT):
-        t = threading.Thread(target=reference_worker, args=(download_queue, base_data_dir, 2))
-        t.start()
-        reference_threads.append(t)
-
-    t1.join()
-    for t in download_threads:
-        t.join()
-    for t in reference_threads:
-        t.join()
+    asyncio.run(main())
 
     end_time = time.time()
     print(f"Pipeline complete. Total time: {end_time - start_time:.2f} seconds")
@@ -1,5 +1,16 @@
 import os
-import json
+import orjson
+
+
+def write_json(path, obj, indent=False):
+    """
+    Serialize with orjson — native code emitting UTF-8 bytes directly,
+    several times faster than stdlib json and half the bytes on disk
+    when indentation is off.
+    """
+    option = orjson.OPT_INDENT_2 if indent else 0
+    with open(path, "wb") as f:
+        f.write(orjson.dumps(obj, option=option))
 
 
 def create_metadata(paper):
@@ -52,8 +63,8 @@ def save_metadata(paper, folder):
     os.makedirs(folder_path, exist_ok=True)
     save_path = os.path.join(folder_path, "metadata.json")
 
-    with open(save_path, "w", encoding="utf-8") as f:
-        json.dump(metadata, f, indent=4, ensure_ascii=False)
+    # metadata.json gets inspected by hand — keep it indented
+    write_json(save_path, metadata, indent=True)
 
     print(f"💾 Saved metadata to {save_path}")
     return metadata
@@ -1,24 +1,124 @@
-import requests
-import json
+import asyncio
+import httpx
+import orjson
 import os
-import time
-import re
-from downloader import format_yymm_id
+from downloader import format_yymm_id, parse_retry_after
+from metadata_collector import write_json
 
-def get_paper_references(arxiv_id, delay=2):
+S2_BATCH_URL = "https://api.semanticscholar.org/graph/v1/paper/batch"
+S2_BATCH_SIZE = 500  # documented maximum for /paper/batch
+S2_REFERENCE_FIELDS = "references.title,references.authors,references.year,references.venue,references.externalIds,references.publicationDate"
+
+REF_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".cache", "references")
+USE_CACHE = True  # flipped off by the --no-cache flag in main.py
+
+
+def load_cached_references(clean_id):
+    """Return the cached S2 payload for a paper, or None on miss/disabled cache."""
+    if not USE_CACHE:
+        return None
+    path = os.path.join(REF_CACHE_DIR, f"{format_yymm_id(clean_id)}.json")
+    if os.path.exists(path):
+        try:
+            with open(path, "rb") as f:
+                return orjson.loads(f.read())
+        except (OSError, orjson.JSONDecodeError):
+            return None
+    return None
+
+
+def store_cached_references(clean_id, references):
+    """Persist the raw S2 references payload so reruns skip the network."""
+    if not USE_CACHE:
+        return
+    os.makedirs(REF_CACHE_DIR, exist_ok=True)
+    path = os.path.join(REF_CACHE_DIR, f"{format_yymm_id(clean_id)}.json")
+    write_json(path, references)
+
+
+async def fetch_references_batch(session, ids, delay=2):
+    """
+    Fetch references for up to 500 papers in a single POST to /paper/batch.
+
+    Args:
+        session: shared httpx.AsyncClient
+        ids: list of arXiv IDs (version suffix stripped if present)
+        delay: delay between retries in seconds
+
+    Returns:
+        dict: {clean arXiv ID: list of references}. IDs the batch endpoint
+        could not resolve are absent — callers fall back to the single-ID path.
+    """
+    # Base IDs contain only digits and a dot, so everything from the first
+    # 'v' on is the version suffix — no regex needed
+    clean_ids = [i.split('v')[0] for i in ids]
+
+    # Serve what we can from the disk cache; only POST the misses
+    result = {}
+    misses = []
+    for clean_id in clean_ids:
+        cached = load_cached_references(clean_id)
+        if cached is not None:
+            result[clean_id] = cached
+        else:
+            misses.append(clean_id)
+    if not misses:
+        return result
+    clean_ids = misses
+
+    params = {"fields": S2_REFERENCE_FIELDS}
+    headers = {}
+    api_key = os.environ.get("S2_API_KEY")
+    if api_key:
+        headers["x-api-key"] = api_key
+
+    while True:
+        try:
+            response = await session.post(S2_BATCH_URL, params=params,
+                                          json={"ids": [f"ARXIV:{i}" for i in clean_ids]},
+                                          headers=headers)
+            if response.status_code == 200:
+                data = orjson.loads(response.content)
+                break
+            elif response.status_code == 429:
+                wait = parse_retry_after(response.headers) or delay
+                print(f"  Rate limit hit. Waiting {wait}s before retry...")
+                await asyncio.sleep(wait)
+            else:
+                print(f"  Batch API returned status {response.status_code}, retrying in {delay}s...")
+                await asyncio.sleep(delay)
+        except httpx.HTTPError as e:
+            print(f"  Request error: {e}, retrying in {delay}s...")
+            await asyncio.sleep(delay)
+
+    # Response is positional: one entry per requested ID, None for misses
+    for clean_id, paper in zip(clean_ids, data):
+        if paper:
+            references = paper.get("references", [])
+            result[clean_id] = references
+            store_cached_references(clean_id, references)
+    return result
+
+
+async def get_paper_references(session, arxiv_id, delay=2):
     """
     Fetch references for a paper from Semantic Scholar API.
-    
+
     Args:
+        session: shared httpx.AsyncClient (same one used for downloads)
         arxiv_id: arXiv ID (format: YYMM.NNNNN or YYMM.NNNNNvN)
-        retry: number of retry attempts
         delay: delay between retries in seconds
-    
+
     Returns:
         list: List of references with detailed information
     """
     # Clean arxiv_id (remove version suffix if present)
-    clean_id = re.sub(r'v\d+$', '', arxiv_id)
+    clean_id = arxiv_id.split('v')[0]
+
+    cached = load_cached_references(clean_id)
+    if cached is not None:
+        return cached
+
     url = f"https://api.semanticscholar.org/graph/v1/paper/arXiv:{clean_id}"
     params = {
         "fields": "references,references.title,references.authors,references.year,references.venue,references.externalIds,references.publicationDate"
@@ -26,119 +126,91 @@ def get_paper_references(arxiv_id, delay=2):
 
     while True:
         try:
-            response = requests.get(url, params=params, timeout=10)
+            response = await session.get(url, params=params)
             if response.status_code == 200:
-                data = response.json()
-                return data.get("references", [])
+                references = orjson.loads(response.content).get("references", [])
+                store_cached_references(clean_id, references)
+                return references
             elif response.status_code == 429:
-                print(f"  Rate limit hit. Waiting {delay}s before retry...")
-                time.sleep(delay)
+                wait = parse_retry_after(response.headers) or delay
+                print(f"  Rate limit hit. Waiting {wait}s before retry...")
+                await asyncio.sleep(wait)
             elif response.status_code == 404:
                 print(f"  Paper {arxiv_id} not found in Semantic Scholar")
                 return []
             else:
                 print(f"  API returned status {response.status_code}, retrying in {delay}s...")
-                time.sleep(delay)
-        except requests.exceptions.RequestException as e:
+                await asyncio.sleep(delay)
+        except httpx.HTTPError as e:
             print(f"  Request error: {e}, retrying in {delay}s...")
-            time.sleep(delay)
- 
+            await asyncio.sleep(delay)
+
+
+# Output schema, precomputed once: the first four fields are always
+# written, the last four only when they carry a value
+_REQUIRED_FIELDS = ('title', 'authors', 'submission_date', 'revised_dates')
+_OPTIONAL_FIELDS = ('doi', 'arxiv_id', 'venue', 'year')
+
 
 def convert_to_references_dict(references):
     """
     Convert Semantic Scholar references to the required format:
-    Dictionary with arXiv IDs as keys (in "yyyymm-id" format) for papers with arXiv IDs.
-    For papers without arXiv IDs, use DOI or generate a unique key.
-    
+    Dictionary with arXiv IDs as keys (in "yyyymm-id" format).
+    References without an arXiv ID are dropped.
+
     Args:
         references: List of references from Semantic Scholar API
-    
+
     Returns:
         dict: Dictionary with paper IDs as keys and metadata as values
     """
     result = {}
-    non_arxiv_counter = 1
-    
+
     for ref in references:
         # The reference data is directly in ref, not under "citedPaper"
-        
+
         # Skip if reference is None or empty
         if not ref:
             continue
-        
-        # Extract external IDs (may be None)
-        external_ids = ref.get("externalIds", {})
-        if external_ids is None:
-            external_ids = {}
-        
+
+        # Only keep references that have an arXiv ID (externalIds may be None)
+        external_ids = ref.get("externalIds") or {}
         arxiv_id = external_ids.get("ArXiv", "")
-        doi = external_ids.get("DOI", "")
-        # Only keep references that have arXiv_id
         if not arxiv_id:
             continue
-        
-        # Determine the key for this reference
-        if arxiv_id:
-            # Use arXiv ID in yyyymm-id format
-            key = format_yymm_id(arxiv_id)
-        elif doi:
-            # Use DOI as key (sanitize it)
-            key = f"doi:{doi.replace('/', '_')}"
-        else:
-            # Generate a unique key for papers without arXiv ID or DOI
-            title = ref.get("title", "")
-            if title:
-                # Use first word of title + counter
-                first_word = re.sub(r'[^\w]', '', title.split()[0] if title.split() else "unknown")
-                key = f"ref_{first_word[:20]}_{non_arxiv_counter}"
-            else:
-                key = f"ref_unknown_{non_arxiv_counter}"
-            non_arxiv_counter += 1
-        
-        # Extract authors
-        authors_list = ref.get("authors", [])
-        authors = [author.get("name", "") for author in authors_list if author.get("name")]
-        
-        # Extract dates (use publicationDate if available)
-        publication_date = ref.get("publicationDate", "")
+
         year = ref.get("year")
-        
-        # If no publication date but have year, create an ISO-like format
-        if not publication_date and year:
-            publication_date = f"{year}-01-01"  # Use Jan 1st as placeholder
-        
-        # Build metadata dictionary with required fields
-        metadata = {
-            "title": ref.get("title", ""),
-            "authors": authors,
-            "submission_date": publication_date if publication_date else "",
-            "revised_dates": []  # Semantic Scholar doesn't provide revision history
-        }
-        
-        # Add optional fields for reference
-        if doi:
-            metadata["doi"] = doi
-        if arxiv_id:
-            metadata["arxiv_id"] = arxiv_id
-        if ref.get("venue"):
-            metadata["venue"] = ref.get("venue")
-        if year:
-            metadata["year"] = year
-        
-        result[key] = metadata
-    
+        values = (
+            ref.get("title", ""),
+            [a["name"] for a in ref.get("authors") or () if a.get("name")],
+            # publicationDate, with Jan 1st of `year` as placeholder
+            # (Semantic Scholar doesn't provide revision history)
+            ref.get("publicationDate") or (f"{year}-01-01" if year else ""),
+            [],
+            external_ids.get("DOI", ""),
+            arxiv_id,
+            ref.get("venue"),
+            year,
+        )
+        metadata = dict(zip(_REQUIRED_FIELDS, values))
+        metadata.update((f, v) for f, v in zip(_OPTIONAL_FIELDS, values[4:]) if v)
+        result[format_yymm_id(arxiv_id)] = metadata
+
     return result
 
 
-def save_references(arxiv_id, paper_folder, verbose=True):
+async def save_references(session, arxiv_id, paper_folder, references=None, verbose=True):
     """
     Fetch and save references for a paper version to both JSON and BibTeX formats.
-    
+
     Args:
+        session: shared httpx.AsyncClient
         arxiv_id: arXiv ID (e.g., "2304.07856v1")
         version_folder: Path to version folder (e.g., "data/2304.07856/v1/")
+        references: pre-fetched references (from the batch endpoint);
+                    None means fetch via the single-paper endpoint
         verbose: Whether to print progress messages
-    
+
     Returns:
         bool: True if successful, False otherwise
     """
@@ -149,43 +221,62 @@ def save_references(arxiv_id, paper_folder, verbose=True):
     if verbose:
         print(f"Fetching references for {arxiv_id}...")
 
-    references = get_paper_references(arxiv_id)
+    if references is None:
+        references = await get_paper_references(session, arxiv_id)
 
     if not references:
         if verbose:
             print(f"  No references found for {arxiv_id}")
         json_path = os.path.join(paper_folder, "references.json")
-        with open(json_path, 'w', encoding='utf-8') as f:
-            json.dump({}, f, indent=2, ensure_ascii=False)
+        write_json(json_path, {})
         return False
 
     json_path = os.path.join(paper_folder, "references.json")
     references_dict = convert_to_references_dict(references)
     try:
-        with open(json_path, 'w', encoding='utf-8') as f:
-            json.dump(references_dict, f, indent=2, ensure_ascii=False)
+        # references.json is machine-read — no indent, half the bytes
+        write_json(json_path, references_dict)
         if verbose:
             print(f"  Saved {len(references_dict)} references to references.json")
     except Exception as e:
         print(f"  Error saving JSON: {e}")
         return False
-    
 
 
-def extract_references_for_paper(paper_id, base_data_dir="../data"):
+
+async def extract_references_for_paper(session, paper_id, base_data_dir="../data"):
     """
     Extract references for all versions of a paper.
-    
+
     Args:
+        session: shared httpx.AsyncClient
         paper_id: arXiv paper ID without version (e.g., "2304.07856")
         base_data_dir: Base directory containing data folders
-    
+
     Returns:
         dict: Statistics about the extraction
     """
     paper_id_key = format_yymm_id(paper_id)
     paper_folder = os.path.join(base_data_dir, paper_id_key)
-    
-    save_references(paper_id, os.path.join(paper_folder))
-    
-    
\ No newline at end of file
+
+    await save_references(session, paper_id, os.path.join(paper_folder))
+
+
+async def extract_references_for_papers(session, paper_ids, base_data_dir="../data"):
+    """
+    Extract references for a batch of papers with one /paper/batch call.
+
+    Args:
+        session: shared httpx.AsyncClient
+        paper_ids: list of arXiv paper IDs without version (max 500)
+        base_data_dir: Base directory containing data folders
+
+    Papers missing from the batch response (e.g. not indexed yet) fall back
+    to the single-paper endpoint inside save_references.
+    """
+    refs_by_id = await fetch_references_batch(session, paper_ids)
+    for paper_id in paper_ids:
+        paper_folder = os.path.join(base_data_dir, format_yymm_id(paper_id))
+        await save_references(session, paper_id, paper_folder,
+                              references=refs_by_id.get(paper_id))
+